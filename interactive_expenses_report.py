@@ -2,7 +2,6 @@
 Script to process the data included in the CSV
 """
 import os
-import re
 
 
 from lib.graphs import (
@@ -11,7 +10,10 @@ from lib.graphs import (
     get_category_detailed_bar_graphs,
 )
 from lib.html_report import generate_report
-from lib.stats import get_categories_by_year_with_subcategory
+from lib.stats import (
+    get_categories_average_in_year_with_subcategories,
+    get_categories_by_year_with_subcategory,
+)
 from lib.transaction import read_transactions
 
 from settings import INPUT_DIR
@@ -24,10 +26,12 @@ def get_input_files() -> list[str]:
     """
     root = os.path.dirname(os.path.abspath(__file__))
     input_dir = os.path.join(root, INPUT_DIR)
-    csv_files: list[str] = []
-    for file in os.listdir(input_dir):
-        if re.search(r".csv$", file):
-            csv_files.append(os.path.join(input_dir, file))
+    with os.scandir(input_dir) as entries:
+        csv_files: list[str] = [
+            entry.path
+            for entry in entries
+            if entry.name.endswith(".csv") and entry.is_file()
+        ]
     if not csv_files:
         raise ValueError(f"No *.csv files where found in {input_dir}")
 
@@ -40,10 +44,17 @@ def main():
     """
     transactions = read_transactions(get_input_files())
 
-    overview_graphs = get_overview_graphs(transactions)
-    category_details_graphs = get_category_detailed_bar_graphs(transactions)
-    category_avg_graphs = get_category_average_bar_graphs(transactions)
+    # Yearly aggregations shared by the table and the average graphs, compute them only once
     year_expenses = get_categories_by_year_with_subcategory(transactions)
+    average_expenses = get_categories_average_in_year_with_subcategories(
+        transactions, year_expenses
+    )
+
+    overview_graphs = get_overview_graphs(transactions, average_expenses)
+    category_details_graphs = get_category_detailed_bar_graphs(transactions)
+    category_avg_graphs = get_category_average_bar_graphs(
+        transactions, average_expenses
+    )
 
     generate_report(
         graphs_overview=overview_graphs,
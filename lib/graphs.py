@@ -2,23 +2,41 @@
 Generate some graphs making use of plotly
 """
 
+from collections import OrderedDict
 from dataclasses import dataclass
+from functools import partial
+from typing import Any, Iterable
 
 import plotly.graph_objects as go
-from plotly.offline import plot
+import plotly.io as pio
 
 from lib.stats import (
     get_balance,
     get_balance_percentage,
     get_categories_average_in_year,
-    get_categories_average_in_year_with_subcategories,
     get_categories_by_month,
     get_categories_by_month_with_subcategories,
+    get_category_total_by_month,
     get_metric_average,
     get_transactions_by_month,
 )
 from lib.transaction import Transaction
 
+# Theme of all the graphs, applied by plotly to every new figure
+pio.templates.default = "plotly_dark"
+
+# orjson is a requirement, serialize the figures with it instead of probing for it on each call
+pio.json.config.default_engine = "orjson"
+
+# Line graphs with more points than this are drawn with WebGL
+WEBGL_THRESHOLD = 200
+
+# Colors of the balance markers, losses (0) in red and gains (1) in green
+BALANCE_COLORSCALE = [[0, "red"], [1, "green"]]
+
+# Options of the plotly.js graphs embedded in the report, resized together with the page
+HTML_CONFIG = {"showLink": False, "responsive": True}
+
 
 class GraphTemplate:
     """
@@ -32,7 +50,6 @@ class GraphTemplate:
     def __init__(self, transactions: list[Transaction]) -> None:
         self.transactions = transactions
         self.fig = go.Figure()
-        self.fig.update_layout(template=self._get_default_theme_template())
 
     def plot(self):
         """
@@ -44,12 +61,10 @@ class GraphTemplate:
         """
         Return graph as html code
         """
-        return plot(
-            self.fig,
-            output_type="div",
-            show_link=False,
+        return self.fig.to_html(
+            full_html=False,
             include_plotlyjs=False,
-            image_height=800,
+            config=HTML_CONFIG,
         )
 
     @classmethod
@@ -59,6 +74,9 @@ class GraphTemplate:
         outside the tendency of the graph
         weight: Weight between 0 and 1
         """
+        if not scalars:
+            return []
+
         last = scalars[0]  # First value in the plot (first timestep)
         smoothed = []
         for point in scalars:
@@ -71,11 +89,28 @@ class GraphTemplate:
         return smoothed
 
     @classmethod
-    def _get_default_theme_template(cls):
+    def _get_scatter_type(cls, points: int) -> type[go.Scatter] | type[go.Scattergl]:
+        """
+        Return the trace type to draw a line of the given amount of points. Long timelines are
+        rendered with WebGL as SVG gets slow with many points
+        """
+        if points > WEBGL_THRESHOLD:
+            return go.Scattergl
+
+        return go.Scatter
+
+    @classmethod
+    def _get_balance_marker(cls, values: Iterable[float]) -> dict[str, Any]:
         """
-        Return the default templates to create a theme for the graphs
+        Set the color of each value depending on its sign, red for losses and green for gains.
+        The colors are encoded as 0/1 on a two color scale instead of one color name per point
         """
-        return "plotly_dark"
+        return {
+            "color": [int(value > 0) for value in values],
+            "colorscale": BALANCE_COLORSCALE,
+            "cmin": 0,
+            "cmax": 1,
+        }
 
 
 class IncomeExpenses(GraphTemplate):
@@ -93,51 +128,49 @@ class IncomeExpenses(GraphTemplate):
         """
         expenses = get_transactions_by_month(self.transactions, "EXPENSE")
         income = get_transactions_by_month(self.transactions, "INCOME")
-
-        # EXPENSES
-        self.fig.add_trace(
-            go.Scatter(
-                name="Expenses",
-                marker_color="red",
-                x=list(expenses.keys()),
-                y=list(expenses.values()),
-            ),
-        )
-
-        # Expenses trend
-        expenses_trend = self._smooth_curve(list(expenses.values()), 0.9)
-        self.fig.add_trace(
-            go.Scatter(
-                name="Expenses smoothed",
-                mode="lines",
-                x=list(expenses.keys()),
-                y=expenses_trend,
-                marker_color="red",
-                opacity=0.3,
-            ),
-        )
-
-        # INCOME
-        self.fig.add_trace(
-            go.Scatter(
-                name="Income",
-                marker_color="green",
-                x=list(income.keys()),
-                y=list(income.values()),
-            )
-        )
-
-        # Income trend
-        income_trend = self._smooth_curve(list(income.values()), 0.9)
-        self.fig.add_trace(
-            go.Scatter(
-                name="Income smoothed",
-                mode="lines",
-                x=list(income.keys()),
-                y=income_trend,
-                marker_color="green",
-                opacity=0.3,
-            ),
+        expenses_months, expenses_values = list(expenses), list(expenses.values())
+        income_months, income_values = list(income), list(income.values())
+        scatter = self._get_scatter_type(len(expenses_months))
+
+        expenses_trend = self._smooth_curve(expenses_values, 0.9)
+        income_trend = self._smooth_curve(income_values, 0.9)
+
+        # Add all traces at once, every add_trace call validates the whole figure data again
+        self.fig.add_traces(
+            [
+                # EXPENSES
+                scatter(
+                    name="Expenses",
+                    marker_color="red",
+                    x=expenses_months,
+                    y=expenses_values,
+                ),
+                # Expenses trend
+                scatter(
+                    name="Expenses smoothed",
+                    mode="lines",
+                    x=expenses_months,
+                    y=expenses_trend,
+                    marker_color="red",
+                    opacity=0.3,
+                ),
+                # INCOME
+                scatter(
+                    name="Income",
+                    marker_color="green",
+                    x=income_months,
+                    y=income_values,
+                ),
+                # Income trend
+                scatter(
+                    name="Income smoothed",
+                    mode="lines",
+                    x=income_months,
+                    y=income_trend,
+                    marker_color="green",
+                    opacity=0.3,
+                ),
+            ]
         )
 
         # Axis
@@ -158,43 +191,34 @@ class Balance(GraphTemplate):
         Create balance subplot
         """
         balance = get_balance(self.transactions)
-
-        # BALANCE
-        self.fig.add_trace(
-            go.Scatter(
-                name="Balance",
-                mode="lines+markers",
-                x=list(balance.keys()),
-                y=list(balance.values()),
-                marker_color=list(map(self.__set_color, list(balance.values()))),
-                line_color="orange",
-            ),
-        )
-
-        # Balance trend
-        balance_trend = self._smooth_curve(list(balance.values()), 0.9)
-        self.fig.add_trace(
-            go.Scatter(
-                name="Balance smoothed",
-                mode="lines",
-                x=list(balance.keys()),
-                y=balance_trend,
-                marker_color="orange",
-                opacity=0.3,
-            ),
+        months, values = list(balance), list(balance.values())
+        scatter = self._get_scatter_type(len(months))
+
+        balance_trend = self._smooth_curve(values, 0.9)
+        self.fig.add_traces(
+            [
+                # BALANCE
+                scatter(
+                    name="Balance",
+                    mode="lines+markers",
+                    x=months,
+                    y=values,
+                    marker=self._get_balance_marker(values),
+                    line_color="orange",
+                ),
+                # Balance trend
+                scatter(
+                    name="Balance smoothed",
+                    mode="lines",
+                    x=months,
+                    y=balance_trend,
+                    marker_color="orange",
+                    opacity=0.3,
+                ),
+            ]
         )
         self.fig.update_yaxes(showticksuffix="all", ticksuffix="€")
 
-    @classmethod
-    def __set_color(cls, value) -> str:
-        """
-        Set color base on the values
-        """
-        if value <= 0:
-            return "red"
-
-        return "green"
-
 
 class RelativeBalance(GraphTemplate):
     """
@@ -210,29 +234,31 @@ class RelativeBalance(GraphTemplate):
         Create relative balance plot
         """
         balance = get_balance_percentage(self.transactions)
-
-        # BALANCE %
-        self.fig.add_trace(
-            go.Scatter(
-                name="Balance",
-                mode="lines+markers",
-                x=list(balance.keys()),
-                y=list(balance.values()),
-                marker_color=list(map(self.__set_color, list(balance.values()))),
-                marker_size=7,
-                line_color="orange",
-            ),
-        )
-        balance_percentage_trend = self._smooth_curve(list(balance.values()), 0.9)
-        self.fig.add_trace(
-            go.Scatter(
-                x=list(balance.keys()),
-                y=balance_percentage_trend,
-                mode="lines",
-                name="Balance smoothed",
-                marker_color="goldenrod",
-                opacity=0.5,
-            ),
+        months, values = list(balance), list(balance.values())
+        scatter = self._get_scatter_type(len(months))
+
+        balance_percentage_trend = self._smooth_curve(values, 0.9)
+        self.fig.add_traces(
+            [
+                # BALANCE %
+                scatter(
+                    name="Balance",
+                    mode="lines+markers",
+                    x=months,
+                    y=values,
+                    marker=self._get_balance_marker(values),
+                    marker_size=7,
+                    line_color="orange",
+                ),
+                scatter(
+                    x=months,
+                    y=balance_percentage_trend,
+                    mode="lines",
+                    name="Balance smoothed",
+                    marker_color="goldenrod",
+                    opacity=0.5,
+                ),
+            ]
         )
 
         # Mark average saving
@@ -248,7 +274,7 @@ class RelativeBalance(GraphTemplate):
 
         # Mark last year saving
         last_year = {}
-        for month in list(sorted(balance.keys()))[-12:]:
+        for month in sorted(months)[-12:]:
             last_year[month] = balance[month]
         balance_last_year_avg = get_metric_average(last_year)
         print(last_year)
@@ -270,24 +296,19 @@ class RelativeBalance(GraphTemplate):
         # Axis
         self.fig.update_yaxes(range=[-50, 75], showticksuffix="all", ticksuffix="%")
 
-    @classmethod
-    def __set_color(cls, value) -> str:
-        """
-        Set color base on the values
-        """
-        if value <= 0:
-            return "red"
-
-        return "green"
-
 
 class CategoriesMonthArea(GraphTemplate):
     """
     Plot the expenses divided by main categories in an area stacked plot
     """
 
-    def __init__(self, transactions):
+    def __init__(
+        self,
+        transactions: list[Transaction],
+        expenses: OrderedDict[str, dict[str, float]],
+    ):
         super().__init__(transactions)
+        self.expenses = expenses
         self._create_plot()
 
     def _create_plot(self):
@@ -295,18 +316,18 @@ class CategoriesMonthArea(GraphTemplate):
         Create a plot with all categories stacked in bars sorted by expenses amount.
         This graph does not distinguish between subcategories.
         """
-        expenses = get_categories_by_month(self.transactions, "EXPENSE")
-
-        for category, category_expenses in expenses.items():
-            self.fig.add_trace(
+        self.fig.add_traces(
+            [
                 go.Scatter(
                     name=category,
-                    x=list(category_expenses.keys()),
+                    x=list(category_expenses),
                     y=list(category_expenses.values()),
                     stackgroup="one",
                     mode="lines",
                 )
-            )
+                for category, category_expenses in self.expenses.items()
+            ]
+        )
 
 
 class CategoriesMonthBars(GraphTemplate):
@@ -314,8 +335,13 @@ class CategoriesMonthBars(GraphTemplate):
     Plot the expenses divided by main categories
     """
 
-    def __init__(self, transactions: list[Transaction]):
+    def __init__(
+        self,
+        transactions: list[Transaction],
+        expenses: OrderedDict[str, dict[str, float]],
+    ):
         super().__init__(transactions)
+        self.expenses = expenses
         self._create_plot()
 
     def _create_plot(self):
@@ -323,16 +349,16 @@ class CategoriesMonthBars(GraphTemplate):
         Create a subplot with all categories stacked in bars sorted by expenses amount
         This graph does not distinguish between subcategories.
         """
-        expenses = get_categories_by_month(self.transactions, "EXPENSE")
-
-        for category, category_expenses in expenses.items():
-            self.fig.add_trace(
+        self.fig.add_traces(
+            [
                 go.Bar(
                     name=category,
-                    x=list(category_expenses.keys()),
+                    x=list(category_expenses),
                     y=list(category_expenses.values()),
                 )
-            )
+                for category, category_expenses in self.expenses.items()
+            ]
+        )
 
         self.fig.update_layout(barmode="stack")
 
@@ -345,24 +371,29 @@ class CategoriesAverageYear(GraphTemplate):
     Plot the average expenses by category per year
     """
 
-    def __init__(self, transactions: list[Transaction]):
+    def __init__(
+        self,
+        transactions: list[Transaction],
+        expenses: OrderedDict[str, OrderedDict[int, float]],
+    ):
         super().__init__(transactions)
+        self.expenses = expenses
         self._create_plot()
 
     def _create_plot(self):
         """
         Create a plot with all average expenses per category
         """
-        expenses = get_categories_average_in_year(self.transactions)
-
-        for category, category_expenses in expenses.items():
-            self.fig.add_trace(
+        self.fig.add_traces(
+            [
                 go.Bar(
                     name=category,
-                    x=list(category_expenses.keys()),
+                    x=list(category_expenses),
                     y=list(category_expenses.values()),
                 )
-            )
+                for category, category_expenses in self.expenses.items()
+            ]
+        )
 
         self.fig.update_layout(barmode="stack")
 
@@ -381,31 +412,35 @@ class CategoryDetail(GraphTemplate):
         transactions,
         category: str,
         subcategories: dict[str : dict[str : int | float]],
+        category_expenses: dict[str, float],
     ):
         super().__init__(transactions=transactions)
         self.subcategories = subcategories
         self.category = category
+        self.category_expenses = category_expenses
         self._create_plot()
 
     def _create_plot(self) -> None:
         """
         Create a subplot with all sub categories stacked in bars.
+        Subcategories without any expense are not plotted.
         """
-        for subcategory, subcategory_expenses in self.subcategories.items():
-            self.fig.add_trace(
+        self.fig.add_traces(
+            [
                 go.Bar(
                     name=subcategory,
-                    x=list(subcategory_expenses.keys()),
+                    x=list(subcategory_expenses),
                     y=list(subcategory_expenses.values()),
                 )
-            )
+                for subcategory, subcategory_expenses in self.subcategories.items()
+                if any(subcategory_expenses.values())
+            ]
+        )
 
         self.fig.update_layout(barmode="stack")
 
         # Average
-        category_expenses = get_categories_by_month(self.transactions, "EXPENSE")[
-            self.category
-        ]
+        category_expenses = self.category_expenses
         category_avg = get_metric_average(category_expenses)
         self.fig.add_hline(
             y=category_avg,
@@ -416,7 +451,7 @@ class CategoryDetail(GraphTemplate):
 
         # Average last year
         last_year = {}
-        for month in list(sorted(category_expenses.keys()))[-12:]:
+        for month in sorted(category_expenses)[-12:]:
             last_year[month] = category_expenses[month]
 
         last_year_avg = get_metric_average(last_year)
@@ -452,14 +487,16 @@ class CategoryYearAvg(GraphTemplate):
         """
         Create a subplot with all sub categories stacked in bars.
         """
-        for subcategory, subcategory_expenses in self.subcategories.items():
-            self.fig.add_trace(
+        self.fig.add_traces(
+            [
                 go.Bar(
                     name=subcategory,
-                    x=list(subcategory_expenses["year"].keys()),
+                    x=list(subcategory_expenses["year"]),
                     y=list(subcategory_expenses["year"].values()),
                 )
-            )
+                for subcategory, subcategory_expenses in self.subcategories.items()
+            ]
+        )
 
         self.fig.update_layout(barmode="stack")
 
@@ -477,24 +514,36 @@ class HTMLGraph:
     html: str
 
 
-def get_overview_graphs(transactions: list[Transaction]) -> list[HTMLGraph]:
+def get_overview_graphs(
+    transactions: list[Transaction], average_expenses: dict[str, Any]
+) -> list[HTMLGraph]:
     """
     Generate the graphs that summarize the balance and expenses
+    average_expenses: Result of get_categories_average_in_year_with_subcategories
     """
+    # Shared by several graphs, compute it only once
+    category_expenses = get_categories_by_month(transactions, "EXPENSE")
+
     graph_list = {
-        "Income & expenses": IncomeExpenses,
-        "Balance": Balance,
-        "Relative balance": RelativeBalance,
-        "Expenses per category (stacked area)": CategoriesMonthArea,
-        "Expenses per category (bars)": CategoriesMonthBars,
-        "Category average monthly expense per year": CategoriesAverageYear,
+        "Income & expenses": partial(IncomeExpenses, transactions),
+        "Balance": partial(Balance, transactions),
+        "Relative balance": partial(RelativeBalance, transactions),
+        "Expenses per category (stacked area)": partial(
+            CategoriesMonthArea, transactions, category_expenses
+        ),
+        "Expenses per category (bars)": partial(
+            CategoriesMonthBars, transactions, category_expenses
+        ),
+        "Category average monthly expense per year": partial(
+            CategoriesAverageYear,
+            transactions,
+            get_categories_average_in_year(transactions, average_expenses),
+        ),
     }
 
     overview_graphs = []
     for name, graph in graph_list.items():
-        overview_graphs.append(
-            HTMLGraph(name=name, html=graph(transactions=transactions).get_html())
-        )
+        overview_graphs.append(HTMLGraph(name=name, html=graph().get_html()))
     return overview_graphs
 
 
@@ -502,25 +551,29 @@ def get_category_detailed_bar_graphs(
     transactions: list[Transaction],
 ) -> list[HTMLGraph]:
     """
-    Return a list of graphs with the details of each category for each month
+    Return a list of graphs with the details of each category for each month.
+    Every category gets a graph, even without expenses, as the yearly table links to all of them.
     """
     expenses = get_categories_by_month_with_subcategories(transactions, "EXPENSE")
     graphs = []
     for category, cat_expenses in expenses.items():
-        cat_details = CategoryDetail(transactions, category, cat_expenses)
+        category_expenses = get_category_total_by_month(cat_expenses)
+        cat_details = CategoryDetail(
+            transactions, category, cat_expenses, category_expenses
+        )
         graphs.append(HTMLGraph(name=category, html=cat_details.get_html()))
     return graphs
 
 
-def get_category_average_bar_graphs(transactions: list[Transaction]) -> list[HTMLGraph]:
+def get_category_average_bar_graphs(
+    transactions: list[Transaction], average_expenses: dict[str, Any]
+) -> list[HTMLGraph]:
     """
     Return a dict of graphs with all categories divided in subcategories. Structure:
-
+    average_expenses: Result of get_categories_average_in_year_with_subcategories
     """
-    expenses = get_categories_average_in_year_with_subcategories(transactions)
-
     graphs: list[HTMLGraph] = []
-    for category, cat_expenses in expenses.items():
+    for category, cat_expenses in average_expenses.items():
         cat_details = CategoryYearAvg(
             transactions, category, cat_expenses["subcategories"]
         )
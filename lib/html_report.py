@@ -1,15 +1,27 @@
 """
 Generate the report using jinja
 """
+from __future__ import annotations
+
 import os
 from datetime import datetime
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 from jinja2 import Environment, FileSystemLoader
-from lib.graphs import HTMLGraph
 
 from settings import CURRENCY, OUTPUT_DIR, TITLE
 
+# Only needed for the type hints, avoid importing plotly when only the report is rendered
+if TYPE_CHECKING:
+    from lib.graphs import HTMLGraph
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The template is compiled once when the module is loaded, it does not change while running
+TEMPLATES_DIR = os.path.join(ROOT_DIR, "templates")
+ENV = Environment(loader=FileSystemLoader(TEMPLATES_DIR), auto_reload=False)
+REPORT_TEMPLATE = ENV.get_template("report.html")
+
 
 def generate_report(
     graphs_overview: list[HTMLGraph],
@@ -22,26 +34,18 @@ def generate_report(
     The report will be generated in the folder provided in the settings file which shall be placed
     inside the project
     """
-    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
-
-    # Get template
-    templates_dir = os.path.join(root, "templates")
-    env = Environment(loader=FileSystemLoader(templates_dir))
-    template = env.get_template("report.html")
-
     # Set report output
     date_today = datetime.now().strftime("%Y-%m-%d")
-    filename = os.path.join(root, OUTPUT_DIR, f"{date_today}-report.html")
+    filename = os.path.join(ROOT_DIR, OUTPUT_DIR, f"{date_today}-report.html")
 
+    # Write the report while it is rendered instead of building the whole document in memory
     with open(filename, "w", encoding="utf8") as file_handle:
-        file_handle.write(
-            template.render(
-                title=TITLE,
-                graphs_overview=graphs_overview,
-                graphs_category_details=graphs_category_details,
-                graphs_category_avg=graphs_category_avg,
-                year_expenses=year_expenses,
-                currency=CURRENCY,
-            )
-        )
+        REPORT_TEMPLATE.stream(
+            title=TITLE,
+            graphs_overview=graphs_overview,
+            graphs_category_details=graphs_category_details,
+            graphs_category_avg=graphs_category_avg,
+            year_expenses=year_expenses,
+            currency=CURRENCY,
+        ).dump(file_handle)
     print(f"Document saved in {filename}")
@@ -3,49 +3,36 @@ This file takes charge of grouping and sorting all transactions to be plotted
 """
 from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
 from typing import Any
 
 from lib.transaction import Transaction
 
 
-def _get_min_date(transactions: list[Transaction]) -> datetime | None:
+def _get_date_range(transactions: list[Transaction]) -> tuple[datetime, datetime]:
     """
-    Return the date of the oldest transaction
+    Return the date of the oldest and the newest transaction
     """
-    min_date: datetime | None = None
-    for transaction in transactions:
-        if min_date is None:
-            min_date = transaction.date
-        else:
-            if min_date > transaction.date:
-                min_date = transaction.date
-    return min_date
+    if not transactions:
+        raise RuntimeError("Dates could not be found")
 
+    dates = [transaction.date for transaction in transactions]
+    return min(dates), max(dates)
 
-def _get_max_date(transactions: list[Transaction]) -> datetime | None:
+
+@lru_cache(maxsize=None)
+def _get_month_key(year: int, month: int) -> str:
     """
-    Return the date of the oldest transaction
+    Return the key used to group the transactions by month, e.g. "22_03"
+    There are only a few different months, so every key is formatted only once
     """
-    max_date: datetime | None = None
-    for transaction in transactions:
-        if max_date is None:
-            max_date = transaction.date
-        else:
-            if max_date < transaction.date:
-                max_date = transaction.date
-    return max_date
+    return f"{year % 100:02d}_{month:02d}"
 
 
-def get_months(transactions: list[Transaction]) -> list[str]:
+def _get_months_between(min_date: datetime, max_date: datetime) -> list[str]:
     """
-    Return a list of strings for each month of each year available in the transactions
+    Return a list of strings for each month between both dates, both included
     """
-    min_date = _get_min_date(transactions)
-    max_date = _get_max_date(transactions)
-
-    if min_date is None or max_date is None:
-        raise RuntimeError("Dates could not be found")
-
     months: list[str] = []
     for year in range(min_date.year, max_date.year + 1):
         for month in range(1, 12 + 1):
@@ -53,12 +40,25 @@ def get_months(transactions: list[Transaction]) -> list[str]:
                 continue
             if year == max_date.year and month > max_date.month:
                 continue
-            month_number = datetime(1900, month, 1).strftime("%m")
-            months.append(f"{str(year)[-2:]}_{month_number}")
+            months.append(_get_month_key(year, month))
 
     return months
 
 
+def get_months(transactions: list[Transaction]) -> list[str]:
+    """
+    Return a list of strings for each month of each year available in the transactions
+    """
+    return _get_months_between(*_get_date_range(transactions))
+
+
+def _get_month_index(date: datetime, min_date: datetime) -> int:
+    """
+    Return the position of the month of the date in the list returned by _get_months_between
+    """
+    return (date.year - min_date.year) * 12 + date.month - min_date.month
+
+
 def get_transactions_by_month(
     raw_transactions: list[Transaction], trans_type: str
 ) -> dict[str, float]:
@@ -66,34 +66,54 @@ def get_transactions_by_month(
     Get the total expenses by month of the given list of transactions
     trans_type: Can be the string 'EXPENSE' or 'INCOME'
     """
-    transactions: dict[str, float] = {}
+    min_date, max_date = _get_date_range(raw_transactions)
+    months = _get_months_between(min_date, max_date)
+
+    # The months are consecutive, so each one is stored in a list at its distance to the first
+    # month. All months start at 0 and are already sorted.
+    totals: list[float] = [0] * len(months)
     for transaction in raw_transactions:
         if transaction.transaction_type != trans_type:
             continue
 
-        date = f'{str(transaction.date.year)[-2:]}_{transaction.date.strftime("%m")}'
-        if date in transactions:
-            transactions[date] = transactions[date] + abs(transaction.value)
-        else:
-            transactions[date] = abs(transaction.value)
+        index = _get_month_index(transaction.date, min_date)
+        totals[index] = totals[index] + transaction.abs_value
 
-    # Set to 0 all months that are not present
-    months = get_months(raw_transactions)
-    for month in months:
-        if not month in transactions:
-            transactions[month] = 0
+    return dict(zip(months, totals))
 
-    transactions = dict(sorted(transactions.items()))
 
-    return transactions
+def _get_expenses_and_income_by_month(
+    transactions: list[Transaction],
+) -> tuple[dict[str, float], dict[str, float]]:
+    """
+    Get the total expenses and the total income by month going only once through the
+    transactions. Both dicts contain all months sorted chronologically.
+    """
+    min_date, max_date = _get_date_range(transactions)
+    months = _get_months_between(min_date, max_date)
+
+    # Same month index as in get_transactions_by_month
+    expenses: list[float] = [0] * len(months)
+    income: list[float] = [0] * len(months)
+    for transaction in transactions:
+        if transaction.transaction_type == "EXPENSE":
+            totals = expenses
+        elif transaction.transaction_type == "INCOME":
+            totals = income
+        else:
+            continue
+
+        index = _get_month_index(transaction.date, min_date)
+        totals[index] = totals[index] + transaction.abs_value
+
+    return dict(zip(months, expenses)), dict(zip(months, income))
 
 
 def get_balance(transactions: list[Transaction]) -> dict[str, float]:
     """
     Get difference between expenses and income per month
     """
-    expenses = get_transactions_by_month(transactions, "EXPENSE")
-    income = get_transactions_by_month(transactions, "INCOME")
+    expenses, income = _get_expenses_and_income_by_month(transactions)
     balance: dict[str, float] = {}
     for date, expense in expenses.items():
         income_value = income[date]
@@ -105,8 +125,7 @@ def get_balance_percentage(transactions: list[Transaction]) -> dict[str, float]:
     """
     Get difference between expenses and income per month as a percentage
     """
-    expenses = get_transactions_by_month(transactions, "EXPENSE")
-    income = get_transactions_by_month(transactions, "INCOME")
+    expenses, income = _get_expenses_and_income_by_month(transactions)
     balance: dict[str, float] = {}
     for date, expense in expenses.items():
         income_value = income[date]
@@ -134,19 +153,13 @@ def _sort_categories_by_expense(expenses: dict[str, Any]) -> list[str]:
     Sort the categories from the one with more expenses to the least
     See: https://stackoverflow.com/questions/613183/how-do-i-sort-a-dictionary-by-value
     """
-    category_total_expenses: dict[str, float] = {}
-    for category in expenses.keys():
-        for date in expenses[category]:
-            if category in category_total_expenses:
-                category_total_expenses[category] = (
-                    category_total_expenses[category] + expenses[category][date]
-                )
-            else:
-                category_total_expenses[category] = expenses[category][date]
-    category_total_expenses = OrderedDict(
-        sorted(category_total_expenses.items(), key=lambda x: x[1], reverse=True)
+    category_total_expenses = {
+        category: sum(category_expenses.values())
+        for category, category_expenses in expenses.items()
+    }
+    return sorted(
+        category_total_expenses, key=category_total_expenses.__getitem__, reverse=True
     )
-    return list(map(str, category_total_expenses.keys()))
 
 
 def get_categories_by_month(
@@ -156,36 +169,31 @@ def get_categories_by_month(
     Return a dict with the list of categories (without subcategories)
     trans_type: Can be 'EXPENSE' or 'INCOME'
     """
-    expenses = {}
+    min_date, max_date = _get_date_range(transactions)
+    months = _get_months_between(min_date, max_date)
+
+    # Monthly totals of each category indexed like in get_transactions_by_month
+    totals: dict[str, list[float]] = {}
     for transaction in transactions:
         if transaction.transaction_type != trans_type:
             continue
 
-        date = f'{str(transaction.date.year)[-2:]}_{transaction.date.strftime("%m")}'
-        category = transaction.category
-
-        if category not in expenses:
-            expenses[category] = {}
+        category_totals = totals.get(transaction.category)
+        if category_totals is None:
+            category_totals = totals[transaction.category] = [0] * len(months)
 
-        if date not in expenses[category]:
-            expenses[category][date] = abs(transaction.value)
-        else:
-            expenses[category][date] = expenses[category][date] + abs(transaction.value)
+        index = _get_month_index(transaction.date, min_date)
+        category_totals[index] = category_totals[index] + transaction.abs_value
 
-    # Fill empty categories
-    months = get_months(transactions)
-    for category, cat_expenses in expenses.items():
-        for month in months:
-            if not month in cat_expenses:
-                cat_expenses[month] = 0
+    expenses = {
+        category: dict(zip(months, category_totals))
+        for category, category_totals in totals.items()
+    }
 
     # Sort by total amount spent
-    sorted_categories = _sort_categories_by_expense(expenses)
-
-    # Sort dates
     category_expenses = OrderedDict()
-    for category in sorted_categories:
-        category_expenses[category] = dict(sorted(expenses[category].items()))
+    for category in _sort_categories_by_expense(expenses):
+        category_expenses[category] = expenses[category]
 
     return category_expenses
 
@@ -199,29 +207,11 @@ def get_categories_by_month_with_subcategories(
     trans_type: Can be 'EXPENSE' or 'INCOME'
     """
 
-    def _fill_empty_subcategories(expenses):
-        """
-        Fill with a 0 all months that are empty
-        """
-        # Fill empty categories
-        months = get_months(transactions)
-        for category, category_expenses in expenses.items():
-            for subcategory, subcategory_expenses in category_expenses.items():
-                for month in months:
-                    if not month in subcategory_expenses:
-                        expenses[category][subcategory][month] = 0
-        return expenses
-
     def _sort_categories(expenses):
         """
-        Sort the categories by sum of expenses and sort the dates chronologically
+        Sort the categories by sum of expenses
         """
-        for category, category_expenses in expenses.items():
-            for subcategory, subcategory_expenses in category_expenses.items():
-                expenses[category][subcategory] = dict(
-                    sorted(subcategory_expenses.items())
-                )
-
+        for category in expenses:
             # Sort from more expenses to less the subcategories
             expenses[category] = OrderedDict(
                 sorted(
@@ -232,37 +222,54 @@ def get_categories_by_month_with_subcategories(
             )
         return expenses
 
-    expenses = {}
+    min_date, max_date = _get_date_range(transactions)
+    months = _get_months_between(min_date, max_date)
+
+    # Monthly totals of each subcategory indexed like in get_transactions_by_month
+    totals: dict[str, dict[str, list[float]]] = {}
     for transaction in transactions:
         if transaction.transaction_type != trans_type:
             continue
 
-        date = f'{str(transaction.date.year)[-2:]}_{transaction.date.strftime("%m")}'
-        category = transaction.category
         subcategory = transaction.subcategory
-
-        if not category in expenses:
-            expenses[category] = {}
-
         if not subcategory:
             subcategory = "No subcategory"
 
-        if not subcategory in expenses[category]:
-            expenses[category][subcategory] = {}
-
-        if not date in expenses[category][subcategory]:
-            expenses[category][subcategory][date] = abs(transaction.value)
-        else:
-            expenses[category][subcategory][date] = expenses[category][subcategory][
-                date
-            ] + abs(transaction.value)
-
-    expenses = _fill_empty_subcategories(expenses)
+        category_totals = totals.setdefault(transaction.category, {})
+        subcategory_totals = category_totals.get(subcategory)
+        if subcategory_totals is None:
+            subcategory_totals = category_totals[subcategory] = [0] * len(months)
+
+        index = _get_month_index(transaction.date, min_date)
+        subcategory_totals[index] = subcategory_totals[index] + transaction.abs_value
+
+    expenses = {
+        category: {
+            subcategory: dict(zip(months, subcategory_totals))
+            for subcategory, subcategory_totals in category_totals.items()
+        }
+        for category, category_totals in totals.items()
+    }
     expenses = _sort_categories(expenses)
 
     return expenses
 
 
+def get_category_total_by_month(
+    subcategories: dict[str, dict[str, float]]
+) -> dict[str, float]:
+    """
+    Return the monthly expenses of a category by adding up the monthly expenses of its
+    subcategories as returned by get_categories_by_month_with_subcategories. This reuses that
+    aggregation instead of going again through all transactions.
+    """
+    category_expenses: dict[str, float] = {}
+    for subcategory_expenses in subcategories.values():
+        for month, value in subcategory_expenses.items():
+            category_expenses[month] = category_expenses.get(month, 0) + value
+    return category_expenses
+
+
 def get_categories_by_year_with_subcategory(
     transactions: list[Transaction],
 ) -> dict[str, Any]:
@@ -290,43 +297,25 @@ def get_categories_by_year_with_subcategory(
         Fill the summary of all years and expenses
         """
         # Sum of all
-        if "sum" not in expenses:
-            expenses["sum"] = value
-        else:
-            expenses["sum"] = expenses["sum"] + value
+        expenses["sum"] = expenses.get("sum", 0) + value
 
         # Global expenses
-        if "year" not in expenses:
-            expenses["year"] = {}
-
-        if date not in expenses["year"]:
-            expenses["year"][date] = value
-        else:
-            expenses["year"][date] = expenses["year"][date] + value
+        year_expenses = expenses.setdefault("year", {})
+        year_expenses[date] = year_expenses.get(date, 0) + value
         return expenses
 
     def _fill_category(expenses, category, date, value):
         """
         Fill the category in the structure
         """
-        if "categories" not in expenses:
-            expenses["categories"] = {}
-
-        if category not in expenses["categories"]:
-            expenses["categories"][category] = {}
-            expenses["categories"][category]["sum"] = value
-            expenses["categories"][category]["year"] = {}
-        else:
-            expenses["categories"][category]["sum"] = (
-                value + expenses["categories"][category]["sum"]
-            )
+        categories = expenses.setdefault("categories", {})
+        category_expenses = categories.get(category)
+        if category_expenses is None:
+            category_expenses = categories[category] = {"sum": 0, "year": {}}
 
-        if date not in expenses["categories"][category]["year"]:
-            expenses["categories"][category]["year"][date] = value
-        else:
-            expenses["categories"][category]["year"][date] = (
-                value + expenses["categories"][category]["year"][date]
-            )
+        category_expenses["sum"] = category_expenses["sum"] + value
+        year_expenses = category_expenses["year"]
+        year_expenses[date] = year_expenses.get(date, 0) + value
 
         return expenses
 
@@ -334,43 +323,24 @@ def get_categories_by_year_with_subcategory(
         """
         Fill the subcategory in the structure within a category
         """
-        if "subcategories" not in expenses["categories"][category]:
-            expenses["categories"][category]["subcategories"] = {}
+        subcategories = expenses["categories"][category].setdefault("subcategories", {})
 
         if subcategory is None or subcategory == "":
             subcategory = "No subcategory"
 
-        if not subcategory in expenses["categories"][category]["subcategories"]:
-            expenses["categories"][category]["subcategories"][subcategory] = {}
-            expenses["categories"][category]["subcategories"][subcategory][
-                "sum"
-            ] = value
-            expenses["categories"][category]["subcategories"][subcategory]["year"] = {}
-        else:
-            expenses["categories"][category]["subcategories"][subcategory]["sum"] = (
-                value
-                + expenses["categories"][category]["subcategories"][subcategory]["sum"]
-            )
+        subcategory_expenses = subcategories.get(subcategory)
+        if subcategory_expenses is None:
+            subcategory_expenses = subcategories[subcategory] = {"sum": 0, "year": {}}
 
-        if (
-            not date
-            in expenses["categories"][category]["subcategories"][subcategory]["year"]
-        ):
-            expenses["categories"][category]["subcategories"][subcategory]["year"][
-                date
-            ] = value
-        else:
-            expenses["categories"][category]["subcategories"][subcategory]["year"][
-                date
-            ] = (
-                value
-                + expenses["categories"][category]["subcategories"][subcategory][
-                    "year"
-                ][date]
-            )
+        subcategory_expenses["sum"] = subcategory_expenses["sum"] + value
+        year_expenses = subcategory_expenses["year"]
+        year_expenses[date] = year_expenses.get(date, 0) + value
 
         return expenses
 
+    # The order is not only cosmetic: the exports list the newest transaction first, so going
+    # backwards inserts the years, categories and subcategories in chronological order of first
+    # appearance. The table of the report iterates these dicts in that order.
     expenses = {}
     for transaction in reversed(transactions):
         if transaction.transaction_type != "EXPENSE":
@@ -379,7 +349,7 @@ def get_categories_by_year_with_subcategory(
         date = transaction.date.year
         category = transaction.category
         subcategory = transaction.subcategory
-        value = abs(transaction.value)
+        value = transaction.abs_value
 
         expenses = _fill_global_expenses(expenses, date, value)
         expenses = _fill_category(expenses, category, date, value)
@@ -388,14 +358,14 @@ def get_categories_by_year_with_subcategory(
     return expenses
 
 
-def _get_number_of_months_with_transactions_in_year(transactions, year):
-    """ "
+def _get_number_of_months_with_transactions_in_year(
+    year: int, min_date: datetime, max_date: datetime
+) -> int:
+    """
     Return the number of months with transactions by checking the last month and the first one
     This is used to calculate the average expenses of a year which has not finished
+    min_date, max_date: Result of _get_date_range
     """
-    min_date: datetime = _get_min_date(transactions)
-    max_date: datetime = _get_max_date(transactions)
-
     if year == min_date.year:
         return 13 - int(min_date.month)
     if year == max_date.year:
@@ -408,59 +378,61 @@ def get_years(transactions) -> list:
     """
     Return the years where there are transactions
     """
-    min_date: datetime = _get_min_date(transactions)
-    max_date: datetime = _get_max_date(transactions)
+    min_date, max_date = _get_date_range(transactions)
 
     return list(range(min_date.year, max_date.year + 1, 1))
 
 
-def get_categories_average_in_year_with_subcategories(transactions):
+def get_categories_average_in_year_with_subcategories(
+    transactions, year_expenses: dict[str, Any] | None = None
+):
     """
     Return the average expenses per category and subcategory per year
+    year_expenses: Result of get_categories_by_year_with_subcategory if it is already available
     """
-    year_expenses = get_categories_by_year_with_subcategory(transactions)["categories"]
-    years = get_years(transactions)
+    if year_expenses is None:
+        year_expenses = get_categories_by_year_with_subcategory(transactions)
+    # The number of months of each year is the same for all categories, compute it only once
+    min_date, max_date = _get_date_range(transactions)
+    months_per_year = {
+        year: _get_number_of_months_with_transactions_in_year(year, min_date, max_date)
+        for year in range(min_date.year, max_date.year + 1)
+    }
+
+    def _get_year_average(expenses_by_year):
+        """
+        Divide the expenses of each year by its number of months, years without expenses are 0
+        """
+        return {
+            year: expenses_by_year[year] / months if year in expenses_by_year else 0
+            for year, months in months_per_year.items()
+        }
 
     avg_expenses = {}
-    for category, cat_expenses in year_expenses.items():
-        avg_expenses[category] = {"year": {}, "subcategories": {}}  # Initialize
-
+    for category, cat_expenses in year_expenses["categories"].items():
         if not "year" in cat_expenses:
             cat_expenses["year"] = {}
 
-        for year in years:
-            if year in cat_expenses["year"]:
-                avg_expenses[category]["year"][year] = cat_expenses["year"][
-                    year
-                ] / _get_number_of_months_with_transactions_in_year(transactions, year)
-            else:
-                avg_expenses[category]["year"][year] = 0
-
-        for subcategory, subcat_expenses in cat_expenses["subcategories"].items():
-            avg_expenses[category]["subcategories"][subcategory] = {"year": {}}
-
-            for subyear in years:
-                if subyear in subcat_expenses["year"]:
-                    avg_expenses[category]["subcategories"][subcategory]["year"][
-                        subyear
-                    ] = subcat_expenses["year"][
-                        subyear
-                    ] / _get_number_of_months_with_transactions_in_year(
-                        transactions, subyear
-                    )
-                else:
-                    avg_expenses[category]["subcategories"][subcategory]["year"][
-                        subyear
-                    ] = 0
+        subcategories = cat_expenses["subcategories"]
+        avg_expenses[category] = {
+            "year": _get_year_average(cat_expenses["year"]),
+            "subcategories": {
+                subcategory: {"year": _get_year_average(subcat_expenses["year"])}
+                for subcategory, subcat_expenses in subcategories.items()
+            },
+        }
 
     return avg_expenses
 
 
-def get_categories_average_in_year(transactions):
+def get_categories_average_in_year(transactions, expenses: dict | None = None):
     """
     Return a dict with the average transactions per year
+    expenses: Result of get_categories_average_in_year_with_subcategories if it is already
+    available
     """
-    expenses = get_categories_average_in_year_with_subcategories(transactions)
+    if expenses is None:
+        expenses = get_categories_average_in_year_with_subcategories(transactions)
     years = get_years(transactions)
 
     avg_expenses = {}
@@ -1,114 +1,153 @@
 """
-Pydantic model fo the transactions
+Model of the transactions
 """
-# Disable no-self due to the validators of pydantic
-# pylint: disable=no-self-argument
 import csv
-import re
-from typing import Any, Optional
+import sys
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import lru_cache
+from itertools import chain
+from typing import Iterable
 
-from pydantic import BaseModel, Field, validator  # type: ignore
+# Exports can be several MB, read them in big chunks instead of the default 8 KiB
+READ_BUFFER_SIZE = 1 << 20
 
 
+@lru_cache(maxsize=1024)
 def _fix_utf8_characters(string: str) -> str:
     """
     Remove icons not supported by ansi
+    It is only used for categories and subcategories, which repeat a lot. Caching it also makes all
+    transactions of a (sub)category share the same string.
     """
-    string = re.sub(re.escape("??"), "", string)
-    string = re.sub(re.escape("?"), "", string)
-    return string.strip()
+    return string.replace("??", "").replace("?", "").strip()
 
 
-class Transaction(BaseModel):
+@dataclass(slots=True)
+class Transaction:
     """
     Representation of a transaction
     """
 
-    date: datetime = Field(alias="Date")
-    description: str = Field(alias="Note")
-    category: str = Field(alias="Category")
-    value: float = Field(alias="Amount")
-    tags: str = Field(alias="Tags", default=None)
-    account: str = Field(alias="Account", default=None)
-    wallet: str = Field(alias="Wallet", default=None)
-    subcategory: str = Field(alias="Subcategory", default=None)
-
-    transaction_type: Optional[str] = Field(default=None, alias="Income/Expense")
-
-    @validator("transaction_type", always=True, pre=True)
-    def validate_type(cls, value: Any):
-        """
-        Set a transaction type depending on the amount of the value
-        """
-        if value == "Expense":
-            return "EXPENSE"
-        return "INCOME"
-
-    @validator("date", pre=True)
-    def parse_date(cls, value: Any):
-        """
-        Convert dates to datetime objects
-        """
-        if value is not None:
-            return datetime.strptime(value, "%m/%d/%Y")
-        return value
-
-    @validator(*["subcategory", "category"], pre=True)
-    def fix_utf8(cls, value: Any):
-        """
-        Fix utf8 characters
-        """
-        if value is not None:
-            return _fix_utf8_characters(value)
-        return value
-
-    # pylint: disable=too-few-public-methods
-    class Config:
-        """
-        Pydantic config
-        """
-
-        orm_mode = True
+    # pylint: disable=too-many-instance-attributes
+    date: datetime
+    description: str
+    category: str
+    value: float
+    tags: str | None = None
+    account: str | None = None
+    wallet: str | None = None
+    subcategory: str | None = None
+
+    transaction_type: str | None = None
+
+    # All stats are computed with the absolute value, calculate it only once
+    abs_value: float = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.abs_value = abs(self.value)
+
+
+@lru_cache(maxsize=8192)
+def _parse_date(date: str) -> datetime:
+    """
+    Parse the date of the export (month/day/year, the month and the day are not always padded).
+    Many transactions share the same day, so each different date is only parsed once.
+    """
+    # Faster than strptime, which has to interpret the format string every time
+    month, day, year = date.split("/")
+    return datetime(int(year), int(month), int(day))
+
+
+def _intern(string: str | None) -> str | None:
+    """
+    Share one string object between all transactions with the same value
+    """
+    if string is None:
+        return None
+    return sys.intern(string)
+
+
+def _parse_transaction(row: dict[str, str]) -> Transaction:
+    """
+    Create a transaction from a row of the CSV export, the keys of the row are the column names
+    of the export. The transaction type is set depending on the Income/Expense column.
+    """
+    subcategory = row.get("Subcategory")
+    if subcategory is not None:
+        subcategory = _fix_utf8_characters(subcategory)
+
+    transaction_type = "INCOME"
+    if row.get("Income/Expense") == "Expense":
+        transaction_type = "EXPENSE"
+
+    return Transaction(
+        date=_parse_date(row["Date"]),
+        description=row["Note"],
+        category=_fix_utf8_characters(row["Category"]),
+        value=float(row["Amount"]),
+        tags=row.get("Tags"),
+        account=_intern(row.get("Account")),
+        wallet=_intern(row.get("Wallet")),
+        subcategory=subcategory,
+        transaction_type=transaction_type,
+    )
 
 
 def _remove_duplicated_transactions(
-    transactions: list[Transaction],
+    transactions: Iterable[Transaction],
 ) -> list[Transaction]:
     """
     Remove duplicated transactions to be safe from overlapping exports. Is considered a duplicated
     transaction when the  date, value, category and description match.
     """
-    seen_transactions: set[str] = set()
-    unique_list: list[Transaction] = []
+    # Dicts keep the insertion order, the first occurrence of each transaction is kept
+    unique_transactions: dict[tuple[datetime, float, str, str], Transaction] = {}
+    removed_messages: list[str] = []
     for transaction in transactions:
         unique = (
-            f"{transaction.date.isoformat()}-{transaction.description}"
-            + f"-{transaction.value}-{transaction.description}"
+            transaction.date,
+            transaction.value,
+            transaction.category,
+            transaction.description,
         )
-        if unique not in seen_transactions:
-            unique_list.append(transaction)
-            seen_transactions.add(unique)
-        else:
-            print(f'The following duplicate has been removed:\n -> "{unique}"')
+        if unique_transactions.setdefault(unique, transaction) is not transaction:
+            removed_messages.append(
+                "The following duplicate has been removed:\n -> "
+                + f'"{transaction.date.isoformat()}-{transaction.value}'
+                + f'-{transaction.category}-{transaction.description}"'
+            )
+
+    # Report all duplicates with a single write, overlapping exports can contain many of them
+    if removed_messages:
+        print("\n".join(removed_messages))
 
-    return unique_list
+    return list(unique_transactions.values())
+
+
+def _read_csv_file(csv_file: str) -> list[Transaction]:
+    """
+    Read all the transactions of a single CSV file, each row is parsed as soon as it is read
+    """
+    with open(
+        csv_file, mode="r", encoding="ANSI", buffering=READ_BUFFER_SIZE
+    ) as csvfile:
+        return [
+            _parse_transaction(row) for row in csv.DictReader(csvfile, delimiter=",")
+        ]
 
 
 def read_transactions(csv_files: list[str]) -> list[Transaction]:
     """
-    Read all transactions from a csv file and return them as a list of the pydantic model.
+    Read all transactions from a csv file and return them as a list of transactions.
     """
-    transactions: list[Transaction] = []
-    for csv_file in csv_files:
-        with open(csv_file, mode="r", encoding="ANSI") as csvfile:
-            reader = csv.DictReader(csvfile, delimiter=",")
-            for row in reader:
-                transactions.append(Transaction(**row))  # type: ignore
+    # The duplicates are removed while the files are merged, without building the list of all
+    # transactions first. The files are read in order, so the first occurrence is kept.
+    transactions = _remove_duplicated_transactions(
+        chain.from_iterable(map(_read_csv_file, csv_files))
+    )
 
     if not transactions:
         raise ValueError("No transactions could be found in the CSV file")
 
-    transactions = _remove_duplicated_transactions(transactions)
-
     return transactions